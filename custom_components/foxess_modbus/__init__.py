@@ -4,15 +4,14 @@ Custom integration to integrate FoxESS Modbus with Home Assistant.
 For more details about this integration, please refer to
 https://github.com/nathanmarlor/foxess_modbus
 """
-import asyncio
 import copy
 import logging
 import uuid
 
-from homeassistant.components.energy import data
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import Config
 from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import ConfigEntryNotReady
 from homeassistant.helpers.typing import UNDEFINED
 
 from .const import ADAPTER_ID
@@ -33,15 +32,45 @@ from .const import SERIAL
 from .const import STARTUP_MESSAGE
 from .const import TCP
 from .const import UDP
-from .inverter_adapters import ADAPTERS
-from .inverter_profiles import inverter_connection_type_profile_from_config
-from .modbus_client import ModbusClient
-from .modbus_controller import ModbusController
-from .services import update_charge_period_service
-from .services import write_registers_service
 
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 
+# Used by async_migrate_entry to infer an adapter from a version 1 config.
+# Keyed on (modbus type, connection type if TCP else None)
+_MIGRATION_ADAPTER_IDS = {
+    (TCP, "LAN"): "direct",
+    (SERIAL, None): "serial_other",
+}
+
+
+class _ClientCache(dict):
+    """Dict of (modbus type, host) to ModbusClient, which creates clients on demand"""
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        super().__init__()
+        self._hass = hass
+
+    def __missing__(self, key: tuple[str, str]):
+        from .modbus_client import ModbusClient
+
+        modbus_type, host = key
+        params = {MODBUS_TYPE: modbus_type}
+        if modbus_type in [TCP, UDP]:
+            # rsplit, so a port is still found if the host contains colons
+            host_parts = host.rsplit(":", 1)
+            try:
+                port = int(host_parts[1])
+            except (IndexError, ValueError) as ex:
+                raise ConfigEntryNotReady(
+                    f"Unable to parse port from host '{host}'"
+                ) from ex
+            params.update({"host": host_parts[0], "port": port})
+        else:
+            params.update({"port": host, "baudrate": 9600})
+        client = ModbusClient(self._hass, params)
+        self[key] = client
+        return client
+
 
 async def async_setup(hass: HomeAssistant, config: Config):
     """Set up this integration using YAML is not supported."""
@@ -51,6 +80,14 @@ async def async_setup(hass: HomeAssistant, config: Config):
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Set up this integration using UI."""
 
+    # Import these lazily, so HA doesn't have to pay for them (or pymodbus) just to
+    # run async_setup or a config migration
+    from .inverter_adapters import ADAPTERS
+    from .inverter_profiles import inverter_connection_type_profile_from_config
+    from .modbus_controller import ModbusController
+    from .services import update_charge_period_service
+    from .services import write_registers_service
+
     if DOMAIN not in hass.data:
         _LOGGER.info(STARTUP_MESSAGE)
 
@@ -60,71 +97,80 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     entry_data = copy.deepcopy(dict(entry.data))
     entry_options = copy.deepcopy(dict(entry.options))
 
-    # Create this before throwing ConfigEntryAuthFailed, so the sensors, etc, platforms don't fail
-    hass.data.setdefault(DOMAIN, {}).setdefault(entry.entry_id, {})[INVERTERS] = []
-
-    for platform in PLATFORMS:
-        if entry_options.get(platform, True):
-            hass.async_add_job(
-                hass.config_entries.async_forward_entry_setup(entry, platform)
-            )
-
-    def create_controller(hass, client, inverter):
-        controller = ModbusController(
-            hass,
-            client,
-            inverter_connection_type_profile_from_config(inverter),
-            inverter[MODBUS_SLAVE],
-            inverter[POLL_RATE],
-            inverter[MAX_READ],
-        )
-        inverter_controllers.append((inverter, controller))
-
     inverter_controllers = []
 
-    # {(modbus_type, host): client}
-    clients: dict[tuple[str, str], ModbusClient] = {}
+    clients = _ClientCache(hass)
+    # {adapter_id: config}, as inverters often share an adapter model
+    adapter_config_cache: dict[str, dict] = {}
+    # Remember that there might not be any options
+    inverter_options_map = entry_options.get(INVERTERS) or {}
     for inverter_id, inverter in entry_data[INVERTERS].items():
-        # Remember that there might not be any options
-        options = entry_options.get(INVERTERS, {}).get(inverter_id, {})
+        options = inverter_options_map.get(inverter_id)
 
         # Pick the adapter out of the user options if it's there
-        adapter_id = options.get(ADAPTER_ID, inverter[ADAPTER_ID])
+        adapter_id = (
+            options.get(ADAPTER_ID, inverter[ADAPTER_ID])
+            if options
+            else inverter[ADAPTER_ID]
+        )
 
         # Merge in adapter options. This lets us tweak the adapters later, and those settings are reflected back to users
         # Handle an adapter in need of manual input to complete migration
         # Do this after the lines above, so we can respond to an adapter in the options
-        inverter.update(ADAPTERS[adapter_id].inverter_config())
+        adapter_config = adapter_config_cache.get(adapter_id)
+        if adapter_config is None:
+            adapter_config = ADAPTERS[adapter_id].inverter_config()
+            adapter_config_cache[adapter_id] = adapter_config
+        inverter.update(adapter_config)
 
         # Merge in the user's options, if any. These can override the adapter options set above
         if options:
             inverter.update(options)
 
-        client_key = (inverter[MODBUS_TYPE], inverter[HOST])
-        client = clients.get(client_key)
-        if client is None:
-            params = {MODBUS_TYPE: inverter[MODBUS_TYPE]}
-            if inverter[MODBUS_TYPE] in [TCP, UDP]:
-                host_parts = inverter[HOST].split(":")
-                params.update({"host": host_parts[0], "port": int(host_parts[1])})
-            else:
-                params.update({"port": inverter[HOST], "baudrate": 9600})
-            client = ModbusClient(hass, params)
-            clients[client_key] = client
-        create_controller(hass, client, inverter)
+        client = clients[(inverter[MODBUS_TYPE], inverter[HOST])]
+        controller = ModbusController(
+            hass,
+            client,
+            inverter_connection_type_profile_from_config(inverter),
+            inverter[MODBUS_SLAVE],
+            inverter[POLL_RATE],
+            inverter[MAX_READ],
+        )
+        inverter_controllers.append((inverter, controller))
+
+    # Register once per HA instance, not once per entry. The services look up the
+    # current controllers themselves, so they survive entry reloads
+    if not hass.services.has_service(DOMAIN, "write_registers"):
+        write_registers_service.register(hass)
+        update_charge_period_service.register(hass)
 
-    write_registers_service.register(hass, inverter_controllers)
-    update_charge_period_service.register(hass, inverter_controllers)
+    hass.data.setdefault(DOMAIN, {})[entry.entry_id] = {
+        INVERTERS: inverter_controllers,
+        "unload": entry.add_update_listener(async_reload_entry),
+    }
 
-    hass.data[DOMAIN][entry.entry_id][INVERTERS] = inverter_controllers
+    enabled_platforms = [
+        platform for platform in PLATFORMS if entry_options.get(platform, True)
+    ]
+    # Most users leave everything enabled
+    if len(enabled_platforms) == len(PLATFORMS):
+        enabled_platforms = PLATFORMS
 
-    hass.data[DOMAIN][entry.entry_id]["unload"] = entry.add_update_listener(
-        async_reload_entry
-    )
+    # Do this after hass.data is populated, as the platforms read it
+    await hass.config_entries.async_forward_entry_setups(entry, enabled_platforms)
 
     return True
 
 
+def _iter_inverters_in_v1_config(data):
+    """Flatten a version 1 config's modbus type -> host -> friendly name nesting"""
+    for modbus_type, modbus_type_inverters in data.items():
+        if modbus_type in (TCP, UDP, SERIAL):
+            for host, host_inverters in modbus_type_inverters.items():
+                for friendly_name, inverter in host_inverters.items():
+                    yield modbus_type, host, friendly_name, inverter
+
+
 async def async_migrate_entry(hass: HomeAssistant, config_entry: ConfigEntry) -> bool:
     _LOGGER.debug("Migrating from version %s", config_entry.version)
 
@@ -144,30 +190,28 @@ async def async_migrate_entry(hass: HomeAssistant, config_entry: ConfigEntry) ->
             inverter_options = {}
             options = UNDEFINED
 
-        for modbus_type, modbus_type_inverters in config_entry.data.items():
-            if modbus_type in [TCP, UDP, SERIAL]:
-                for host, host_inverters in modbus_type_inverters.items():
-                    for friendly_name, inverter in host_inverters.items():
-                        if friendly_name == "null":
-                            friendly_name = ""
-                        inverter[MODBUS_TYPE] = modbus_type
-                        inverter[HOST] = host
-                        inverter[FRIENDLY_NAME] = friendly_name
-                        # We can infer what the adapter type is, ish
-                        if modbus_type == TCP:
-                            if inverter[INVERTER_CONN] == "LAN":
-                                adapter = ADAPTERS["direct"]
-                            else:
-                                adapter = ADAPTERS["network_other"]
-                        elif modbus_type == SERIAL:
-                            adapter = ADAPTERS["serial_other"]
-                        inverter[ADAPTER_ID] = adapter.adapter_id
-                        inverter[ADAPTER_WAS_MIGRATED] = True
-
-                        inverter_id = str(uuid.uuid4())
-                        new_data[INVERTERS][inverter_id] = inverter
-                        if inverter_options:
-                            options[INVERTERS][inverter_id] = inverter_options
+        for modbus_type, host, friendly_name, inverter in _iter_inverters_in_v1_config(
+            config_entry.data
+        ):
+            if friendly_name == "null":
+                friendly_name = ""
+            inverter[MODBUS_TYPE] = modbus_type
+            inverter[HOST] = host
+            inverter[FRIENDLY_NAME] = friendly_name
+            # We can infer what the adapter type is, ish
+            adapter_key = (
+                modbus_type,
+                inverter[INVERTER_CONN] if modbus_type == TCP else None,
+            )
+            inverter[ADAPTER_ID] = _MIGRATION_ADAPTER_IDS.get(
+                adapter_key, "network_other"
+            )
+            inverter[ADAPTER_WAS_MIGRATED] = True
+
+            inverter_id = uuid.uuid4().hex
+            new_data[INVERTERS][inverter_id] = inverter
+            if inverter_options:
+                options[INVERTERS][inverter_id] = inverter_options
 
         hass.config_entries.async_update_entry(
             config_entry, data=new_data, options=options
@@ -175,6 +219,8 @@ async def async_migrate_entry(hass: HomeAssistant, config_entry: ConfigEntry) ->
         config_entry.version = 2
 
     if config_entry.version == 2:
+        from homeassistant.components.energy import data
+
         # Fix a badly-set-up energy dashboard
         energy_manager = await data.async_get_manager(hass)
         if energy_manager.data is not None:
@@ -217,19 +263,17 @@ async def async_migrate_entry(hass: HomeAssistant, config_entry: ConfigEntry) ->
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Handle removal of an entry."""
-    unloaded = all(
-        await asyncio.gather(
-            *[
-                hass.config_entries.async_forward_entry_unload(entry, platform)
-                for platform in PLATFORMS
-            ]
-        )
-    )
+    unloaded = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
 
     if unloaded:
         controllers = hass.data[DOMAIN][entry.entry_id][INVERTERS]
         for _, controller in controllers:
-            controller.unload()
+            try:
+                controller.unload()
+            except Exception:
+                # Carry on unloading the other controllers, so one bad controller
+                # doesn't leak the rest
+                _LOGGER.exception("Failed to unload controller %s", controller)
 
         hass.data[DOMAIN][entry.entry_id]["unload"]()
         hass.data[DOMAIN].pop(entry.entry_id)
@@ -239,10 +283,4 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
 async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
     """Reload config entry."""
-    await async_unload_entry(hass, entry)
-    await async_setup_entry(hass, entry)
-
-
-async def options_update_listener(hass: HomeAssistant, config_entry: ConfigEntry):
-    """Handle options update."""
-    await hass.config_entries.async_reload(config_entry.entry_id)
+    await hass.config_entries.async_reload(entry.entry_id)
@@ -19,7 +19,10 @@ async def async_setup_entry(
 
     inverters = hass.data[DOMAIN][entry.entry_id][INVERTERS]
 
+    entities = []
     for inverter, controller in inverters:
-        async_add_devices(
+        entities.extend(
             create_entities(BinarySensorEntity, controller, entry, inverter)
         )
+    if entities:
+        async_add_devices(entities)
@@ -1,5 +1,5 @@
 """Adds config flow for foxess_modbus."""
-import copy
+import asyncio
 import logging
 import re
 import uuid
@@ -63,6 +63,52 @@ _DEFAULT_SLAVE = 247
 
 _LOGGER = logging.getLogger(__name__)
 
+_ENTITY_ID_PREFIX_REGEX = re.compile(r"[a-z0-9_]+")
+
+_NETWORK_PROTOCOLS = frozenset((TCP, UDP))
+
+# Bound how long autodetect can block the config flow UI. Generous enough for a
+# slow serial adapter to read the whole model number
+_AUTODETECT_TIMEOUT_SECS = 30
+
+# Sensor entity id suffixes used to populate the energy dashboard
+_SOLAR_ENERGY_SUFFIXES = ("pv1_energy_total", "pv2_energy_total")
+_BATTERY_CHARGE_SUFFIX = "battery_charge_total"
+_BATTERY_DISCHARGE_SUFFIX = "battery_discharge_total"
+_GRID_CONSUMPTION_SUFFIX = "grid_consumption_energy_total"
+_FEED_IN_SUFFIX = "feed_in_energy_total"
+
+# ADAPTERS grouped by type, so the steps don't have to filter it on every render
+_ADAPTERS_BY_TYPE: dict[InverterAdapterType, list[InverterAdapter]] = {
+    adapter_type: [x for x in ADAPTERS.values() if x.type == adapter_type]
+    for adapter_type in InverterAdapterType
+}
+
+# Static schemas, compiled once rather than on every step render
+_ADAPTER_TYPE_SCHEMA = vol.Schema(
+    {
+        vol.Required("adapter_type"): selector(
+            {
+                "select": {
+                    "options": [x.value for x in InverterAdapterType],
+                    "translation_key": "inverter_adapter_types",
+                }
+            }
+        )
+    }
+)
+
+_ENERGY_DASHBOARD_SCHEMA = vol.Schema(
+    {
+        vol.Required("energy_dashboard", default=False): bool,
+    }
+)
+
+# The TCP/serial adapter schemas depend on the adapter's properties, so cache them
+# per adapter_id
+_TCP_ADAPTER_SCHEMAS: dict[str, vol.Schema] = {}
+_SERIAL_ADAPTER_SCHEMAS: dict[str, vol.Schema] = {}
+
 
 @dataclass
 class InverterData:
@@ -135,6 +181,16 @@ class ModbusFlowHandler(FlowHandlerMixin, config_entries.ConfigFlow, domain=DOMA
         self._inverter_data = InverterData()
         self._all_inverters: list[InverterData] = []
 
+        # Indexes over self._all_inverters, used for duplicate detection
+        self._used_friendly_names: set[str] = set()
+        self._used_entity_id_prefixes: set[str] = set()
+        self._used_connections: set[tuple[str, str, int]] = set()
+
+        # Successful autodetect results, keyed on (protocol, host, slave), so going
+        # back through the flow doesn't re-probe the same inverter. Failures aren't
+        # cached, so the user can fix the device and retry
+        self._autodetect_cache: dict[tuple[str, str, int], tuple[str, str]] = {}
+
         self._adapter_type_to_step = {
             InverterAdapterType.DIRECT: self.async_step_tcp_adapter,
             InverterAdapterType.SERIAL: self.async_step_serial_adapter,
@@ -158,7 +214,7 @@ class ModbusFlowHandler(FlowHandlerMixin, config_entries.ConfigFlow, domain=DOMA
             adapter_type = InverterAdapterType(user_input["adapter_type"])
             self._inverter_data.adapter_type = adapter_type
 
-            adapters = [x for x in ADAPTERS.values() if x.type == adapter_type]
+            adapters = _ADAPTERS_BY_TYPE[adapter_type]
 
             assert len(adapters) > 0
             if len(adapters) == 1:
@@ -167,21 +223,8 @@ class ModbusFlowHandler(FlowHandlerMixin, config_entries.ConfigFlow, domain=DOMA
 
             return await self.async_step_select_adapter_model()
 
-        schema = vol.Schema(
-            {
-                vol.Required("adapter_type"): selector(
-                    {
-                        "select": {
-                            "options": [x.value for x in InverterAdapterType],
-                            "translation_key": "inverter_adapter_types",
-                        }
-                    }
-                )
-            }
-        )
-
         return await self._with_default_form(
-            body, user_input, "select_adapter_type", schema
+            body, user_input, "select_adapter_type", _ADAPTER_TYPE_SCHEMA
         )
 
     async def async_step_select_adapter_model(
@@ -193,9 +236,7 @@ class ModbusFlowHandler(FlowHandlerMixin, config_entries.ConfigFlow, domain=DOMA
             self._inverter_data.adapter = ADAPTERS[user_input["adapter_model"]]
             return await self._adapter_type_to_step[self._inverter_data.adapter_type]()
 
-        adapters = [
-            x for x in ADAPTERS.values() if x.type == self._inverter_data.adapter_type
-        ]
+        adapters = _ADAPTERS_BY_TYPE[self._inverter_data.adapter_type]
 
         schema = vol.Schema(
             {
@@ -242,44 +283,49 @@ class ModbusFlowHandler(FlowHandlerMixin, config_entries.ConfigFlow, domain=DOMA
             )
             return await self.async_step_friendly_name()
 
-        schema_parts = {}
-        description_placeholders = {"setup_link": adapter.setup_link}
+        schema = _TCP_ADAPTER_SCHEMAS.get(adapter.adapter_id)
+        if schema is None:
+            schema_parts = {}
+
+            if len(adapter.network_protocols) > 1:
+                # Prompt for TCP vs UDP if that's relevant
+                # If we provide a recommendation, show that
+                key = (
+                    "protocol_with_recommendation"
+                    if adapter.recommended_protocol is not None
+                    else "protocol"
+                )
+                schema_parts[vol.Required(key)] = selector(
+                    {"select": {"options": adapter.network_protocols}}
+                )
 
-        if len(adapter.network_protocols) > 1:
-            # Prompt for TCP vs UDP if that's relevant
-            # If we provide a recommendation, show that
-            key = (
-                "protocol_with_recommendation"
-                if adapter.recommended_protocol is not None
-                else "protocol"
-            )
-            schema_parts[vol.Required(key)] = selector(
-                {"select": {"options": adapter.network_protocols}}
-            )
-            description_placeholders[
-                "recommended_protocol"
-            ] = adapter.recommended_protocol
+            if adapter.connection_type == AUX:
+                schema_parts[vol.Required("adapter_host")] = cv.string
+                schema_parts[
+                    vol.Required(
+                        "adapter_port",
+                        default=_DEFAULT_PORT,
+                    )
+                ] = int
+            else:
+                # If it's a direct connection we know what the port is
+                schema_parts[vol.Required("lan_connection_host")] = cv.string
 
-        if adapter.connection_type == AUX:
-            schema_parts[vol.Required("adapter_host")] = cv.string
             schema_parts[
                 vol.Required(
-                    "adapter_port",
-                    default=_DEFAULT_PORT,
+                    "modbus_slave",
+                    default=_DEFAULT_SLAVE,
                 )
             ] = int
-        else:
-            # If it's a direct connection we know what the port is
-            schema_parts[vol.Required("lan_connection_host")] = cv.string
 
-        schema_parts[
-            vol.Required(
-                "modbus_slave",
-                default=_DEFAULT_SLAVE,
-            )
-        ] = int
+            schema = vol.Schema(schema_parts)
+            _TCP_ADAPTER_SCHEMAS[adapter.adapter_id] = schema
 
-        schema = vol.Schema(schema_parts)
+        description_placeholders = {"setup_link": adapter.setup_link}
+        if len(adapter.network_protocols) > 1:
+            description_placeholders[
+                "recommended_protocol"
+            ] = adapter.recommended_protocol
 
         return await self._with_default_form(
             body, user_input, "tcp_adapter", schema, description_placeholders
@@ -301,15 +347,18 @@ class ModbusFlowHandler(FlowHandlerMixin, config_entries.ConfigFlow, domain=DOMA
             )
             return await self.async_step_friendly_name()
 
-        schema = vol.Schema(
-            {
-                vol.Required(
-                    "serial_device",
-                    default=adapter.default_host,
-                ): cv.string,
-                vol.Required("modbus_slave", default=_DEFAULT_SLAVE): int,
-            }
-        )
+        schema = _SERIAL_ADAPTER_SCHEMAS.get(adapter.adapter_id)
+        if schema is None:
+            schema = vol.Schema(
+                {
+                    vol.Required(
+                        "serial_device",
+                        default=adapter.default_host,
+                    ): cv.string,
+                    vol.Required("modbus_slave", default=_DEFAULT_SLAVE): int,
+                }
+            )
+            _SERIAL_ADAPTER_SCHEMAS[adapter.adapter_id] = schema
         description_placeholders = {"setup_link": adapter.setup_link}
 
         return await self._with_default_form(
@@ -331,9 +380,7 @@ class ModbusFlowHandler(FlowHandlerMixin, config_entries.ConfigFlow, domain=DOMA
             )
 
         def is_unique_entity_id_prefix(entity_id_prefix: str) -> bool:
-            return not any(
-                x for x in self._all_inverters if x.entity_id_prefix == entity_id_prefix
-            )
+            return entity_id_prefix not in self._used_entity_id_prefixes
 
         show_entity_id_prefix_input = False
         errors = {}
@@ -345,7 +392,7 @@ class ModbusFlowHandler(FlowHandlerMixin, config_entries.ConfigFlow, domain=DOMA
                 "autogenerate_entity_id_prefix", True
             )
 
-            if any(x for x in self._all_inverters if x.friendly_name == friendly_name):
+            if friendly_name in self._used_friendly_names:
                 errors["friendly_name"] = "duplicate_friendly_name"
             else:
                 # 1. If they unchecked "auto-generate entity ID prefix"...
@@ -362,7 +409,7 @@ class ModbusFlowHandler(FlowHandlerMixin, config_entries.ConfigFlow, domain=DOMA
                         entity_id_prefix = user_input["entity_id_prefix"]
                         show_entity_id_prefix_input = True
                         if entity_id_prefix and (
-                            not re.fullmatch(r"[a-z0-9_]+", entity_id_prefix)
+                            not _ENTITY_ID_PREFIX_REGEX.fullmatch(entity_id_prefix)
                             or entity_id_prefix.startswith("_")
                             or entity_id_prefix.endswith("_")
                         ):
@@ -388,6 +435,15 @@ class ModbusFlowHandler(FlowHandlerMixin, config_entries.ConfigFlow, domain=DOMA
                 self._inverter_data.entity_id_prefix = entity_id_prefix
                 self._inverter_data.friendly_name = friendly_name
                 self._all_inverters.append(self._inverter_data)
+                self._used_friendly_names.add(friendly_name)
+                self._used_entity_id_prefixes.add(entity_id_prefix)
+                self._used_connections.add(
+                    (
+                        self._inverter_data.inverter_protocol,
+                        self._inverter_data.host,
+                        self._inverter_data.modbus_slave,
+                    )
+                )
                 self._inverter_data = InverterData()
                 return await self.async_step_add_another_inverter()
 
@@ -427,35 +483,34 @@ class ModbusFlowHandler(FlowHandlerMixin, config_entries.ConfigFlow, domain=DOMA
                 await self._setup_energy_dashboard()
             return self.async_create_entry(title=_TITLE, data=self._create_entry_data())
 
-        schema = vol.Schema(
-            {
-                vol.Required("energy_dashboard", default=False): bool,
-            }
+        return await self._with_default_form(
+            body, user_input, "energy", _ENERGY_DASHBOARD_SCHEMA
         )
 
-        return await self._with_default_form(body, user_input, "energy", schema)
-
     def _create_entry_data(self) -> dict[str, Any]:
         """Create the config entry for all inverters in self._all_inverters"""
 
-        entry = {INVERTERS: {}}
-        for inverter in self._all_inverters:
-            inverter = {
-                INVERTER_BASE: inverter.inverter_base_model,
-                INVERTER_MODEL: inverter.inverter_model,
-                INVERTER_CONN: inverter.adapter.connection_type,
-                MODBUS_SLAVE: inverter.modbus_slave,
-                ENTITY_ID_PREFIX: inverter.entity_id_prefix
-                if inverter.entity_id_prefix
-                else "",
-                FRIENDLY_NAME: inverter.friendly_name if inverter.friendly_name else "",
-                MODBUS_TYPE: inverter.inverter_protocol,
-                HOST: inverter.host,
-                ADAPTER_ID: inverter.adapter.adapter_id,
-            }
-            entry[INVERTERS][str(uuid.uuid4())] = inverter
-        entry[CONFIG_SAVE_TIME] = datetime.now()
-        return entry
+        return {
+            INVERTERS: {
+                uuid.uuid4().hex: {
+                    INVERTER_BASE: inverter.inverter_base_model,
+                    INVERTER_MODEL: inverter.inverter_model,
+                    INVERTER_CONN: inverter.adapter.connection_type,
+                    MODBUS_SLAVE: inverter.modbus_slave,
+                    ENTITY_ID_PREFIX: inverter.entity_id_prefix
+                    if inverter.entity_id_prefix
+                    else "",
+                    FRIENDLY_NAME: inverter.friendly_name
+                    if inverter.friendly_name
+                    else "",
+                    MODBUS_TYPE: inverter.inverter_protocol,
+                    HOST: inverter.host,
+                    ADAPTER_ID: inverter.adapter.adapter_id,
+                }
+                for inverter in self._all_inverters
+            },
+            CONFIG_SAVE_TIME: datetime.now(),
+        }
 
     async def _select_adapter_model_helper(
         self,
@@ -470,7 +525,7 @@ class ModbusFlowHandler(FlowHandlerMixin, config_entries.ConfigFlow, domain=DOMA
         async def body(user_input):
             return await complete_callback(ADAPTERS[user_input["adapter_id"]])
 
-        adapters = [x for x in ADAPTERS.values() if x.type == adapter_type]
+        adapters = _ADAPTERS_BY_TYPE[adapter_type]
 
         schema = vol.Schema(
             {
@@ -497,35 +552,44 @@ class ModbusFlowHandler(FlowHandlerMixin, config_entries.ConfigFlow, domain=DOMA
         self, protocol: str, host: str, slave: int, adapter: InverterAdapter
     ) -> tuple[str, str]:
         """Check that connection details are unique, then connect to the inverter and add its details to self._inverter_data"""
-        if any(
-            x
-            for x in self._all_inverters
-            if x.inverter_protocol == protocol
-            and x.host == host
-            and x.modbus_slave == slave
-        ):
+        if (protocol, host, slave) in self._used_connections:
             raise ValidationFailedException({"base": "duplicate_connection_details"})
 
         try:
-            params = {MODBUS_TYPE: protocol}
-            if protocol in [TCP, UDP]:
-                params.update(
-                    {"host": host.split(":")[0], "port": int(host.split(":")[1])}
+            result = self._autodetect_cache.get((protocol, host, slave))
+            if result is None:
+                params = {MODBUS_TYPE: protocol}
+                if protocol in _NETWORK_PROTOCOLS:
+                    host_part, _, port_part = host.rpartition(":")
+                    params.update({"host": host_part, "port": int(port_part)})
+                elif protocol == SERIAL:
+                    params.update({"port": host, "baudrate": 9600})
+                else:
+                    assert False
+                client = ModbusClient(self.hass, params)
+                result = await asyncio.wait_for(
+                    ModbusController.autodetect(client, slave, adapter),
+                    timeout=_AUTODETECT_TIMEOUT_SECS,
                 )
-            elif protocol == SERIAL:
-                params.update({"port": host, "baudrate": 9600})
-            else:
-                assert False
-            client = ModbusClient(self.hass, params)
-            base_model, full_model = await ModbusController.autodetect(
-                client, slave, adapter
-            )
+                self._autodetect_cache[(protocol, host, slave)] = result
+            base_model, full_model = result
 
             self._inverter_data.inverter_base_model = base_model
             self._inverter_data.inverter_model = full_model
             self._inverter_data.inverter_protocol = protocol
             self._inverter_data.modbus_slave = slave
             self._inverter_data.host = host
+        except asyncio.TimeoutError as ex:
+            raise ValidationFailedException(
+                {
+                    "base": "unable_to_connect_to_inverter"
+                    if adapter.connection_type == LAN
+                    else "unable_to_connect_to_adapter"
+                },
+                error_placeholders={
+                    "error_details": f"timed out after {_AUTODETECT_TIMEOUT_SECS}s"
+                },
+            ) from ex
         except UnsupportedInverterException as ex:
             raise ValidationFailedException(
                 {"base": "inverter_model_not_supported"},
@@ -599,61 +663,58 @@ class ModbusFlowHandler(FlowHandlerMixin, config_entries.ConfigFlow, domain=DOMA
 
         manager = await data.async_get_manager(self.hass)
 
-        entity_id_prefixes = [x.entity_id_prefix for x in self._all_inverters]
-
-        def _prefix_name(name):
-            if name:
-                return f"sensor.{name}_"
-            else:
-                return "sensor."
+        name_prefixes = [
+            f"sensor.{x.entity_id_prefix}_" if x.entity_id_prefix else "sensor."
+            for x in self._all_inverters
+        ]
 
-        energy_prefs = EnergyPreferencesUpdate(energy_sources=[])
-        for entity_id_prefix in entity_id_prefixes:
-            name_prefix = _prefix_name(entity_id_prefix)
-            energy_prefs["energy_sources"].extend(
-                [
-                    SolarSourceType(
-                        type="solar",
-                        stat_energy_from=f"{name_prefix}pv1_energy_total",
-                        config_entry_solar_forecast=None,
-                    ),
+        energy_sources = [
+            source
+            for name_prefix in name_prefixes
+            for source in (
+                *(
                     SolarSourceType(
                         type="solar",
-                        stat_energy_from=f"{name_prefix}pv2_energy_total",
+                        stat_energy_from=name_prefix + suffix,
                         config_entry_solar_forecast=None,
-                    ),
-                    BatterySourceType(
-                        type="battery",
-                        stat_energy_to=f"{name_prefix}battery_charge_total",
-                        stat_energy_from=f"{name_prefix}battery_discharge_total",
-                    ),
-                ]
-            )
-
-        grid_source = GridSourceType(
-            type="grid", flow_from=[], flow_to=[], cost_adjustment_day=0.0
-        )
-        for entity_id_prefix in entity_id_prefixes:
-            name_prefix = _prefix_name(entity_id_prefix)
-            grid_source["flow_from"].append(
-                FlowFromGridSourceType(
-                    stat_energy_from=f"{name_prefix}grid_consumption_energy_total",
-                    stat_cost=None,
-                    entity_energy_price=None,
-                    number_energy_price=None,
-                )
+                    )
+                    for suffix in _SOLAR_ENERGY_SUFFIXES
+                ),
+                BatterySourceType(
+                    type="battery",
+                    stat_energy_to=name_prefix + _BATTERY_CHARGE_SUFFIX,
+                    stat_energy_from=name_prefix + _BATTERY_DISCHARGE_SUFFIX,
+                ),
             )
-            grid_source["flow_to"].append(
-                FlowToGridSourceType(
-                    stat_energy_to=f"{name_prefix}feed_in_energy_total",
-                    stat_compensation=None,
-                    entity_energy_price=None,
-                    number_energy_price=None,
-                )
+        ]
+        energy_sources.append(
+            GridSourceType(
+                type="grid",
+                flow_from=[
+                    FlowFromGridSourceType(
+                        stat_energy_from=name_prefix + _GRID_CONSUMPTION_SUFFIX,
+                        stat_cost=None,
+                        entity_energy_price=None,
+                        number_energy_price=None,
+                    )
+                    for name_prefix in name_prefixes
+                ],
+                flow_to=[
+                    FlowToGridSourceType(
+                        stat_energy_to=name_prefix + _FEED_IN_SUFFIX,
+                        stat_compensation=None,
+                        entity_energy_price=None,
+                        number_energy_price=None,
+                    )
+                    for name_prefix in name_prefixes
+                ],
+                cost_adjustment_day=0.0,
             )
-        energy_prefs["energy_sources"].append(grid_source)
+        )
 
-        await manager.async_update(energy_prefs)
+        await manager.async_update(
+            EnergyPreferencesUpdate(energy_sources=energy_sources)
+        )
 
     @staticmethod
     @callback
@@ -668,6 +729,9 @@ class ModbusOptionsHandler(FlowHandlerMixin, config_entries.OptionsFlow):
     def __init__(self, config: config_entries.ConfigEntry) -> None:
         self._config = config
         self._selected_inverter_id: str | None = None
+        # Built on first use: the set of inverters doesn't change during the
+        # lifetime of the options flow, so there's no need to rebuild it per render
+        self._inverter_select_schema: vol.Schema | None = None
 
     async def async_step_init(self, _user_input=None):
         """Start the config flow"""
@@ -687,28 +751,31 @@ class ModbusOptionsHandler(FlowHandlerMixin, config_entries.OptionsFlow):
             self._selected_inverter_id = user_input["inverter"]
             return await self.async_step_inverter_options()
 
-        schema = vol.Schema(
-            {
-                vol.Required("inverter"): selector(
-                    {
-                        "select": {
-                            "options": [
-                                {
-                                    "label": self._create_label_for_inverter(inverter),
-                                    "value": inverter_id,
-                                }
-                                for inverter_id, inverter in self._config.data[
-                                    INVERTERS
-                                ].items()
-                            ]
+        if self._inverter_select_schema is None:
+            self._inverter_select_schema = vol.Schema(
+                {
+                    vol.Required("inverter"): selector(
+                        {
+                            "select": {
+                                "options": [
+                                    {
+                                        "label": self._create_label_for_inverter(
+                                            inverter
+                                        ),
+                                        "value": inverter_id,
+                                    }
+                                    for inverter_id, inverter in self._config.data[
+                                        INVERTERS
+                                    ].items()
+                                ]
+                            }
                         }
-                    }
-                )
-            }
-        )
+                    )
+                }
+            )
 
         return await self._with_default_form(
-            body, user_input, "select_inverter", schema
+            body, user_input, "select_inverter", self._inverter_select_schema
         )
 
     async def async_step_inverter_options(
@@ -739,15 +806,17 @@ class ModbusOptionsHandler(FlowHandlerMixin, config_entries.OptionsFlow):
             if max_read is not None:
                 inverter_options[MAX_READ] = max_read
 
-            # We must not mutate any part of self._config.options, otherwise HA thinks we haven't changed the options
-            options = copy.deepcopy(dict(self._config.options))
-            options.setdefault(INVERTERS, {})[
-                self._selected_inverter_id
-            ] = inverter_options
+            # We must not mutate any part of self._config.options, otherwise HA thinks we haven't changed the options.
+            # Only the paths we change need fresh identities, so shallow-copy those
+            # rather than deep-copying every leaf
+            options = {**self._config.options}
+            inverters = {**options.get(INVERTERS, {})}
+            inverters[self._selected_inverter_id] = inverter_options
+            options[INVERTERS] = inverters
 
             return self.async_create_entry(title=_TITLE, data=options)
 
-        adapters = [x for x in ADAPTERS.values() if x.type == current_adapter.type]
+        adapters = _ADAPTERS_BY_TYPE[current_adapter.type]
 
         schema_parts = {}
         if len(adapters) > 1:
@@ -6,6 +6,12 @@ from abc import abstractmethod
 class BaseValidator(ABC):
     """Base validator"""
 
+    __slots__ = ()
+
     @abstractmethod
     def validate(self, data) -> bool:
         """Validate a value against a set of rules"""
+
+    def validate_many(self, values) -> list[bool]:
+        """Validate a batch of values, returning a result for each"""
+        return [self.validate(x) for x in values]
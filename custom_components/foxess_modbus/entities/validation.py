@@ -6,6 +6,8 @@ from .modbus_charge_period_sensors import is_time_value_valid
 class Range(BaseValidator):
     """Range validator"""
 
+    __slots__ = ("_min", "_max")
+
     def __init__(self, min_value: float, max_value: float):
         """Init"""
         self._min = min_value
@@ -14,12 +16,19 @@ class Range(BaseValidator):
     def validate(self, data) -> bool:
         """Validate a value against a set of rules"""
 
-        return data >= self._min and data <= self._max
+        return self._min <= data <= self._max
+
+    def validate_many(self, values) -> list[bool]:
+        """Validate a batch of values, returning a result for each"""
+        min_value, max_value = self._min, self._max
+        return [min_value <= x <= max_value for x in values]
 
 
 class Min(BaseValidator):
     """Min validator"""
 
+    __slots__ = ("_min",)
+
     def __init__(self, min_value: float):
         """Init"""
         self._min = min_value
@@ -29,10 +38,17 @@ class Min(BaseValidator):
 
         return data >= self._min
 
+    def validate_many(self, values) -> list[bool]:
+        """Validate a batch of values, returning a result for each"""
+        min_value = self._min
+        return [x >= min_value for x in values]
+
 
 class Max(BaseValidator):
     """Max validator"""
 
+    __slots__ = ("_max",)
+
     def __init__(self, max_value: float):
         """Init"""
         self._max = max_value
@@ -42,10 +58,28 @@ class Max(BaseValidator):
 
         return data <= self._max
 
+    def validate_many(self, values) -> list[bool]:
+        """Validate a batch of values, returning a result for each"""
+        max_value = self._max
+        return [x <= max_value for x in values]
+
 
 class Time(BaseValidator):
     """Time validator"""
 
+    __slots__ = ("_last_data", "_last_result")
+
+    def __init__(self):
+        """Init"""
+        # Time values rarely change between polls, so remember the last answer
+        self._last_data = object()
+        self._last_result = False
+
     def validate(self, data) -> bool:
         """Validate a value against a set of rules"""
-        return is_time_value_valid(data)
+        if data == self._last_data:
+            return self._last_result
+        result = is_time_value_valid(data)
+        self._last_data = data
+        self._last_result = result
+        return result
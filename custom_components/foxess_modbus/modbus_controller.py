@@ -3,10 +3,10 @@ import logging
 import threading
 from contextlib import contextmanager
 from datetime import datetime
-from datetime import timedelta
+from typing import Callable
 from typing import Iterable
 
-from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.event import async_call_later
 from pymodbus.exceptions import ConnectionException
 
 from .common.entity_controller import EntityController
@@ -26,6 +26,10 @@ _LOGGER = logging.getLogger(__name__)
 # How many failed polls before we mark sensors as Unavailable
 _NUM_FAILED_POLLS_FOR_DISCONNECTION = 5
 
+# When polls fail we double the poll rate each time, up to this multiple of the
+# configured poll rate, so we don't hammer a wedged inverter or adapter
+_MAX_POLL_RATE_BACKOFF_MULTIPLIER = 8
+
 _MODEL_START_ADDRESS = 30000
 _MODEL_LENGTH = 15
 
@@ -61,23 +65,34 @@ class ModbusController(EntityController, UnloadController):
         self.charge_periods = connection_type_profile.create_charge_periods()
         self._slave = slave
         self._poll_rate = poll_rate
+        self._current_poll_rate = poll_rate
         self._max_read = max_read
         self._refresh_lock = threading.Lock()
         self._num_failed_poll_attempts = 0
         self._is_connected = True  # Start off assuming we can connect
+        self._stopped = False
+        self._cancel_poll_timer: Callable[[], None] | None = None
 
         # Setup mixins
         EntityController.__init__(self)
         UnloadController.__init__(self)
 
         if self._hass is not None:
-            refresh = async_track_time_interval(
-                self._hass,
-                self._refresh,
-                timedelta(seconds=self._poll_rate),
-            )
+            self._schedule_refresh()
+
+            def stop_polling() -> None:
+                self._stopped = True
+                if self._cancel_poll_timer is not None:
+                    self._cancel_poll_timer()
+                    self._cancel_poll_timer = None
 
-            self._unload_listeners.append(refresh)
+            self._unload_listeners.append(stop_polling)
+
+    def _schedule_refresh(self) -> None:
+        """Schedule the next poll, using the current (possibly backed-off) poll rate"""
+        self._cancel_poll_timer = async_call_later(
+            self._hass, self._current_poll_rate, self._refresh
+        )
 
     @property
     def is_connected(self) -> bool:
@@ -117,6 +132,17 @@ class ModbusController(EntityController, UnloadController):
 
     async def _refresh(self, _time: datetime) -> None:
         """Refresh modbus data"""
+        try:
+            await self._do_refresh()
+        finally:
+            # Reschedule ourselves, using the current poll rate. Scheduling the next
+            # poll after this one completes also means that a slow poll delays the
+            # next one, rather than overlapping it
+            if not self._stopped and self._hass is not None:
+                self._schedule_refresh()
+
+    async def _do_refresh(self) -> None:
+        """Do a single poll of the inverter"""
         # Make sure that we don't do two refreshes at the same time, if one is too slow
         with _acquire_nonblocking(self._refresh_lock) as acquired:
             if not acquired:
@@ -200,6 +226,7 @@ class ModbusController(EntityController, UnloadController):
             # become available after a disconnection
             if exception is None:
                 self._num_failed_poll_attempts = 0
+                self._current_poll_rate = self._poll_rate
                 if not self._is_connected:
                     _LOGGER.info(
                         "%s %s - poll succeeded: now connected",
@@ -208,21 +235,34 @@ class ModbusController(EntityController, UnloadController):
                     )
                     self._is_connected = True
                     self._notify_is_connected_changed()
-            elif self._is_connected:
-                self._num_failed_poll_attempts += 1
-                if (
-                    self._num_failed_poll_attempts
-                    >= _NUM_FAILED_POLLS_FOR_DISCONNECTION
-                ):
-                    _LOGGER.warning(
-                        "%s %s - %s failed poll attempts: now not connected. Last error: %s",
-                        self._client,
-                        self._slave,
-                        self._num_failed_poll_attempts,
-                        exception,
-                    )
-                    self._is_connected = False
-                    self._notify_is_connected_changed()
+            else:
+                # Back off subsequent polls, so we don't hammer an inverter or adapter
+                # which is struggling or unreachable
+                self._current_poll_rate = min(
+                    self._current_poll_rate * 2,
+                    self._poll_rate * _MAX_POLL_RATE_BACKOFF_MULTIPLIER,
+                )
+                _LOGGER.debug(
+                    "%s %s - poll failed: backing off to poll rate %ss",
+                    self._client,
+                    self._slave,
+                    self._current_poll_rate,
+                )
+                if self._is_connected:
+                    self._num_failed_poll_attempts += 1
+                    if (
+                        self._num_failed_poll_attempts
+                        >= _NUM_FAILED_POLLS_FOR_DISCONNECTION
+                    ):
+                        _LOGGER.warning(
+                            "%s %s - %s failed poll attempts: now not connected. Last error: %s",
+                            self._client,
+                            self._slave,
+                            self._num_failed_poll_attempts,
+                            exception,
+                        )
+                        self._is_connected = False
+                        self._notify_is_connected_changed()
 
     def _create_read_ranges(self, max_read: int) -> Iterable[tuple[int, int]]:
         """
@@ -19,5 +19,8 @@ async def async_setup_entry(
 
     inverters = hass.data[DOMAIN][entry.entry_id][INVERTERS]
 
+    entities = []
     for inverter, controller in inverters:
-        async_add_devices(create_entities(SensorEntity, controller, entry, inverter))
+        entities.extend(create_entities(SensorEntity, controller, entry, inverter))
+    if entities:
+        async_add_devices(entities)
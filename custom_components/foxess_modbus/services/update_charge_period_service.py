@@ -16,6 +16,7 @@ from ..entities.modbus_charge_period_sensors import parse_time_value
 from ..entities.modbus_charge_period_sensors import serialize_time_to_value
 from ..modbus_controller import ModbusController
 from .utils import get_controller_from_friendly_name_or_device_id
+from .utils import get_inverter_controllers
 
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 
@@ -125,14 +126,12 @@ _UPDATE_ALL_CHARGE_PERIODS_SCHEMA = vol.Schema(
 )
 
 
-def register(
-    hass: HomeAssistant, inverter_controllers: list[tuple[Any, ModbusController]]
-) -> None:
+def register(hass: HomeAssistant) -> None:
     """Register the service with HA"""
 
     async def _update_charge_period_callback(service_data: ServiceCall):
         await hass.loop.create_task(
-            _update_charge_period(inverter_controllers, service_data, hass)
+            _update_charge_period(get_inverter_controllers(hass), service_data, hass)
         )
 
     hass.services.async_register(
@@ -144,7 +143,9 @@ def register(
 
     async def _update_all_charge_periods_callback(service_data: ServiceCall):
         await hass.loop.create_task(
-            _update_all_charge_periods(inverter_controllers, service_data, hass)
+            _update_all_charge_periods(
+                get_inverter_controllers(hass), service_data, hass
+            )
         )
 
     hass.services.async_register(
@@ -6,9 +6,21 @@ from homeassistant.helpers import device_registry
 
 from ..const import DOMAIN
 from ..const import FRIENDLY_NAME
+from ..const import INVERTERS
 from ..modbus_controller import ModbusController
 
 
+def get_inverter_controllers(
+    hass: HomeAssistant,
+) -> list[tuple[Any, ModbusController]]:
+    """Fetch the (inverter, controller) pairs from all loaded config entries"""
+    return [
+        inverter_controller
+        for entry_data in hass.data.get(DOMAIN, {}).values()
+        for inverter_controller in entry_data.get(INVERTERS, [])
+    ]
+
+
 def get_controller_from_friendly_name_or_device_id(
     device_id: str | None,
     inverter_controllers: list[tuple[Any, ModbusController]],
@@ -11,6 +11,7 @@ from pymodbus.exceptions import ModbusIOException
 from ..const import DOMAIN
 from ..modbus_controller import ModbusController
 from .utils import get_controller_from_friendly_name_or_device_id
+from .utils import get_inverter_controllers
 
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 
@@ -38,12 +39,10 @@ _WRITE_SCHEMA = vol.Schema(
 )
 
 
-def register(
-    hass: HomeAssistant, inverter_controllers: list[tuple[Any, ModbusController]]
-) -> None:
+def register(hass: HomeAssistant) -> None:
     async def _callback(service_data: ServiceCall):
         await hass.loop.create_task(
-            _write_service(inverter_controllers, service_data, hass)
+            _write_service(get_inverter_controllers(hass), service_data, hass)
         )
 
     hass.services.async_register(